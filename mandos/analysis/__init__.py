@@ -6,6 +6,7 @@ from collections import defaultdict
 from typing import Collection, MutableMapping, Sequence, Tuple
 
 import decorateme
+import numpy as np
 
 from mandos.model.hits import AbstractHit, KeyPredObj
 
@@ -16,6 +17,10 @@ class AnalysisUtils:
     def elle(cls, x: float) -> float:
         return math.log10(1 + x)
 
+    @classmethod
+    def elles(cls, x: np.ndarray) -> np.ndarray:
+        return np.log10(1 + x)
+
     @classmethod
     def hit_multidict(cls, hits: Sequence[AbstractHit], key: str):
         x_to_hits = defaultdict(list)
@@ -4,12 +4,13 @@ Calculations of overlap (similarity) between annotation sets.
 import abc
 import math
 import time
-from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Collection, Mapping, Optional, Sequence, Type, Union
+from typing import Collection, Mapping, Optional, Sequence, Tuple, Type, Union
 
 import decorateme
 import numpy as np
+import pandas as pd
 from pocketutils.core.chars import Chars
 from pocketutils.core.enums import CleverEnum
 from pocketutils.core.exceptions import XValueError
@@ -21,38 +22,86 @@ from mandos.analysis.io_defns import SimilarityDfLongForm, SimilarityDfShortForm
 from mandos.model.hit_dfs import HitDf
 from mandos.model.hits import AbstractHit
 from mandos.model.utils import unlink
-
-# note that most of these math functions are much faster than their numpy counterparts
-# if we're not broadcasting, it's almost always better to use them
-# some are more accurate, too
-# e.g. we're using fsum rather than sum
 from mandos.model.utils.setup import logger
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit, prange = None, None
+
+# vee is 0 only where both ℓ values are 0, and then wedge is 0 too
+# so dividing by this instead of vee gives 0 for those pairs
+_TINY = float(np.finfo(np.float64).tiny)
+# max number of (compound, compound, pair) cells to broadcast at once without numba
+# larger blocks are slower once the temporary arrays no longer fit in cache
+_BLOCK_CELLS = 2**16
+
+
+if njit is not None:
+
+    @njit("float64(float64[::1], float64[::1])", cache=True, fastmath=True, nogil=True)
+    def _j_prime_kernel(la: np.ndarray, lb: np.ndarray) -> float:
+        """
+        Calculates J between two rows of ℓ values, or 0 if both rows are all zero.
+        """
+        # no branches in the loop, so that LLVM can vectorize it
+        acc, n = 0.0, 0
+        for k in range(la.shape[0]):
+            a, b = la[k], lb[k]
+            wedge = math.sqrt(a * b)
+            vee = a + b - wedge
+            acc += wedge / max(vee, _TINY)
+            n += vee > 0
+        return acc / n if n > 0 else 0.0
+
+    @njit("void(float64[:, ::1], float64[:, ::1], int64)", cache=True, fastmath=True, nogil=True)
+    def _j_row_kernel(ell: np.ndarray, j: np.ndarray, i: int) -> None:
+        """
+        Fills in J between row i and the rows after it, in both triangles of j.
+        """
+        j[i, i] = 1.0
+        for k in range(i + 1, ell.shape[0]):
+            z = _j_prime_kernel(ell[i], ell[k])
+            j[i, k] = z
+            j[k, i] = z
+
+    @njit("float64[:, ::1](float64[:, ::1])", cache=True, fastmath=True, nogil=True, parallel=True)
+    def _j_matrix_kernel(ell: np.ndarray) -> np.ndarray:
+        """
+        Calculates J between every pair of rows of ℓ values, in parallel over rows.
+        Only the upper triangle is calculated; J is symmetric and 1 on the diagonal.
+        """
+        n = ell.shape[0]
+        j = np.empty((n, n))
+        # row i has n - i - 1 pairs, so pair it with row n - i - 1 to balance the threads
+        for t in prange((n + 1) // 2):
+            _j_row_kernel(ell, j, t)
+            if n - t - 1 != t:
+                _j_row_kernel(ell, j, n - t - 1)
+        return j
+
+else:
+    _j_prime_kernel, _j_row_kernel, _j_matrix_kernel = None, None, None
+
 
 class _Inf:
     def __init__(self, n: int):
         self.n = n
-        self.used, self.t0, self.nonzeros = set(), time.monotonic(), 0
-
-    def is_used(self, c1: str, c2: str) -> bool:
-        return (c1, c2) in self.used or (c2, c1) in self.used
+        self.i, self.t0, self.nonzeros = 0, time.monotonic(), 0
 
-    def got(self, c1: str, c2: str, z: float) -> None:
-        self.used.add((c1, c2))
-        self.nonzeros += int(c1 != c2 and not np.isnan(z) and 0 < z < 1)
-        if self.i % 1000 == 0:
-            self.log("info")
-
-    @property
-    def i(self) -> int:
-        return len(self.used)
+    def got(self, z: np.ndarray) -> None:
+        # comparisons with NaN are always False
+        self.i += len(z)
+        self.nonzeros += int(np.count_nonzero((z > 0) & (z < 1)))
 
     def log(self, level: str) -> None:
         delta = UnitTools.delta_time_to_str(time.monotonic() - self.t0, space=Chars.narrownbsp)
+        # with only 1 compound, there are no pairs
+        pct = self.nonzeros / self.i * 100 if self.i > 0 else 0
         logger.log(
             level.upper(),
             f"Processed {self.i:,}/{self.n:,} pairs in {delta};"
-            + f" {self.nonzeros:,} ({self.nonzeros / self.i * 100:.1f}%) are nonzero",
+            + f" {self.nonzeros:,} ({pct:.1f}%) are nonzero",
         )
 
     def __repr__(self):
@@ -62,6 +111,20 @@ class _Inf:
         return repr(self)
 
 
+@dataclass(frozen=True, repr=True)
+class _PackedHits:
+    """
+    Hits as columns, with InChI Keys, sources, and (key, predicate, object) triples as codes.
+    """
+
+    inchikeys: Sequence[str]
+    sources: Sequence[str]
+    inchikey_codes: np.ndarray
+    source_codes: np.ndarray
+    pair_codes: np.ndarray
+    weights: np.ndarray
+
+
 @decorateme.auto_repr_str()
 class MatrixCalculator(metaclass=abc.ABCMeta):
     def __init__(
@@ -117,12 +180,11 @@ class JPrimeMatrixCalculator(MatrixCalculator):
         bad_excludes = [e for e in self.exclude if e not in keys]
         if len(bad_excludes) > 0:
             logger.error(f"Keys to exclude are not in the input file: {', '.join(bad_excludes)}")
-        for key in keys:
+        for key, dfx in hits.groupby("search_key", sort=False):
             if key not in self.exclude:
-                dfx = hits[hits["search_key"] == key]
-                negatives = dfx[dfx["weight"] <= 0]
-                if len(negatives) > 0:
-                    logger.error(f"{len(negatives)} / {len(dfx):,} hits for {key} are nonpositive")
+                n_negative = int((dfx["weight"] <= 0).sum())
+                if n_negative > 0:
+                    logger.error(f"{n_negative} / {len(dfx):,} hits for {key} are nonpositive")
         return [h for h in hits.to_hits() if h.search_key not in self.exclude and h.weight > 0]
 
     def _calc_partial(self, key: str, key_hits: HitDf) -> SimilarityDfLongForm:
@@ -166,64 +228,107 @@ class JPrimeMatrixCalculator(MatrixCalculator):
         return SimilarityDfLongForm.of(dfs, keys=keys)
 
     def calc_one(self, key: str, hits: Sequence[AbstractHit]) -> SimilarityDfShortForm:
-        ik2hits = Au.hit_multidict(hits, "origin_inchikey")
-        logger.info(f"Calculating J on {key} for {len(ik2hits):,} compounds and {len(hits):,} hits")
-        data = defaultdict(dict)
-        inf = _Inf(n=int(len(ik2hits) * (len(ik2hits) - 1) / 2))
-        for (c1, hits1) in ik2hits.items():
-            for (c2, hits2) in ik2hits.items():
-                if inf.is_used(c1, c2):
-                    continue
-                z = 1 if c1 == c2 else self._j_prime(key, hits1, hits2)
-                data[c1][c2] = z
-                inf.got(c1, c2, z)
+        inchikeys, source_to_weights = self._weight_matrices(hits)
+        n = len(inchikeys)
+        logger.info(f"Calculating J on {key} for {n:,} compounds and {len(hits):,} hits")
+        inf = _Inf(n=int(n * (n - 1) / 2))
+        # J' is the mean of J over the sources that both compounds have
+        totals, counts = np.zeros((n, n)), np.zeros((n, n))
+        for source, weights in source_to_weights.items():
+            j = self._j_source(Au.elles(weights))
+            defined = ~np.isnan(j)
+            totals[defined] += j[defined]
+            counts += defined
+            logger.debug(f"Calculated J on {key} for source {source} ({weights.shape[1]:,} pairs)")
+        with np.errstate(invalid="ignore"):
+            data = totals / counts  # NaN if the compounds share no source
+        np.fill_diagonal(data, 1)
+        upper = np.triu_indices(n, k=1)
+        inf.got(data[upper])
         inf.log("success")
-        return SimilarityDfShortForm.from_dict(data)
+        data[upper] = np.nan  # keep only the lower triangle, so each pair appears once
+        return SimilarityDfShortForm.from_ndarray(data, inchikeys)
 
     def _part_path(self, path: Path, key: str):
         return path.parent / f".{path.name}-{key}.tmp.feather"
 
-    def _j_prime(
-        self, key: str, hits1: Collection[AbstractHit], hits2: Collection[AbstractHit]
-    ) -> float:
-        if len(hits1) == len(hits2) == 0:
-            return float("NaN")  # TODO: Can this even happen?
-        if len(hits1) == 0 or len(hits2) == 0:
-            return 0
-        sources = {h.data_source for h in hits1}.intersection({h.data_source for h in hits2})
-        if len(sources) == 0:
-            return float("NaN")
-        values = [
-            self._jx(
-                key,
-                [h for h in hits1 if h.data_source == source],
-                [h for h in hits2 if h.data_source == source],
-            )
-            for source in sources
-        ]
-        return float(math.fsum(values) / len(values))
-
-    def _jx(
-        self, key: str, hits1: Collection[AbstractHit], hits2: Collection[AbstractHit]
-    ) -> float:
-        if len(hits1) == len(hits2) == 0:
-            return float("NaN")  # TODO: impossible, right?
-        if len(hits1) == 0 or len(hits2) == 0:
-            return 0
-        pair_to_weights = Au.weights_of_pairs(hits1, hits2)
-        values = []
-        for ca, cb in pair_to_weights.values():
-            wedge = self._wedge(ca, cb)
-            vee = self._vee(ca, cb)
-            if vee > 0:
-                values.append(wedge / vee)
-        return float(math.fsum(values) / len(values))
-
-    def _wedge(self, ca: float, cb: float) -> float:
-        return math.sqrt(Au.elle(ca) * Au.elle(cb))
-
-    def _vee(self, ca: float, cb: float) -> float:
-        return Au.elle(ca) + Au.elle(cb) - math.sqrt(Au.elle(ca) * Au.elle(cb))
+    def _pack_hits(self, hits: Sequence[AbstractHit]) -> _PackedHits:
+        """
+        Converts the hits to integer-coded columns in one pass over the hit objects.
+        """
+        df = pd.DataFrame(
+            [
+                (h.origin_inchikey, h.data_source, h.search_key, h.predicate, h.object_name)
+                for h in hits
+            ],
+            columns=["inchikey", "source", "key", "predicate", "object"],
+        )
+        inchikey_codes, inchikeys = pd.factorize(df["inchikey"])
+        source_codes, sources = pd.factorize(df["source"])
+        pair_codes = df.groupby(["key", "predicate", "object"], sort=False, dropna=False).ngroup()
+        return _PackedHits(
+            inchikeys=inchikeys.tolist(),
+            sources=sources.tolist(),
+            inchikey_codes=inchikey_codes.astype(np.int64),
+            source_codes=source_codes.astype(np.int64),
+            pair_codes=pair_codes.to_numpy(dtype=np.int64),
+            weights=np.fromiter((h.weight for h in hits), dtype=np.float64, count=len(hits)),
+        )
+
+    def _weight_matrices(
+        self, hits: Sequence[AbstractHit]
+    ) -> Tuple[Sequence[str], Mapping[str, np.ndarray]]:
+        """
+        Packs the hits into one compound-by-(key, predicate, object) weight matrix per source.
+        Weights of hits with the same compound and (key, predicate, object) are summed.
+        """
+        packed = self._pack_hits(hits)
+        n = len(packed.inchikeys)
+        matrices = {}
+        for s, source in enumerate(packed.sources):
+            idx = np.flatnonzero(packed.source_codes == s)
+            pairs, cols = np.unique(packed.pair_codes[idx], return_inverse=True)
+            cells = packed.inchikey_codes[idx] * len(pairs) + cols
+            w = np.bincount(cells, weights=packed.weights[idx], minlength=n * len(pairs))
+            matrices[source] = w.reshape(n, len(pairs))
+        return packed.inchikeys, matrices
+
+    def _j_source(self, ell: np.ndarray) -> np.ndarray:
+        """
+        Calculates J between every pair of rows of a compound-by-pair matrix of ℓ values.
+        Pairs of compounds for which either compound has no hits are NaN.
+        """
+        present = ell.any(axis=1)
+        if _j_matrix_kernel is None:
+            j = self._j_source_numpy(ell, present)
+        else:
+            j = _j_matrix_kernel(np.ascontiguousarray(ell, dtype=np.float64))
+        j[~present] = np.nan
+        j[:, ~present] = np.nan
+        return j
+
+    def _j_source_numpy(self, ell: np.ndarray, present: np.ndarray) -> np.ndarray:
+        # broadcast a block of rows against the rows from that block down, then mirror
+        # broadcasting all rows at once needs n × n × m memory
+        # but broadcasting one row at a time is dominated by NumPy call overhead
+        idx = np.flatnonzero(present)
+        ell = ell[idx]
+        n, m = ell.shape
+        jp = np.empty((n, n))
+        a = 0
+        while a < n:
+            b = min(n, a + max(1, _BLOCK_CELLS // ((n - a) * m)))
+            wedge = np.sqrt(ell[a:b, None, :] * ell[None, a:, :])
+            vee = ell[a:b, None, :] + ell[None, a:, :] - wedge
+            ratios = wedge / np.maximum(vee, _TINY)
+            z = ratios.sum(axis=2) / np.count_nonzero(vee > 0, axis=2)
+            jp[a:b, a:] = z
+            jp[a:, a:b] = z.T
+            a = b
+        j = np.full((len(present), len(present)), np.nan)
+        j[np.ix_(idx, idx)] = jp
+        np.fill_diagonal(j, 1)
+        return j
 
 
 class MatrixAlg(CleverEnum):
@@ -75,10 +75,16 @@ PhiPsiSimilarityDfLongForm = (
 ).build()
 
 
+def _from_ndarray(cls, data: np.ndarray, inchikeys: Sequence[str]):
+    df = pd.DataFrame(data, index=inchikeys, columns=inchikeys, copy=False)
+    return cls.convert(df)
+
+
 SimilarityDfShortForm = (
     TypedDfs.affinity_matrix("SimilarityDfShortForm")
     .dtype(np.float64)
     .add_methods(to_long_form=_to_long_form)
+    .add_classmethods(from_ndarray=_from_ndarray)
     .secure()
 ).build()
 
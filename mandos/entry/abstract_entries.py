@@ -1,6 +1,7 @@
 import abc
+from functools import cache
 from pathlib import Path
-from typing import Generic, Mapping, Optional, Type, TypeVar, Union
+from typing import Any, Generic, Mapping, Optional, Type, TypeVar, Union
 
 import typer
 from pocketutils.tools.reflection_tools import ReflectionTools
@@ -26,9 +27,13 @@ class Entry(Generic[S], metaclass=abc.ABCMeta):
         return key
 
     @classmethod
+    @cache
     def describe(cls) -> str:
-        lines = [line.strip() for line in cls.run.__doc__.splitlines() if line.strip() != ""]
-        return lines[0]
+        for line in (cls.run.__doc__ or "").splitlines():
+            line = line.strip()
+            if line != "":
+                return line
+        raise AssertionError(f"No description for {cls.__name__}")
 
     @classmethod
     def run(cls, path: Path, **params) -> None:
@@ -74,18 +79,24 @@ class Entry(Generic[S], metaclass=abc.ABCMeta):
     def default_param_values(cls) -> Mapping[str, Union[str, float, int, Path]]:
         return {
             param: (value.default if isinstance(value, OptionInfo) else value)
-            for param, value in ReflectionTools.default_arg_values(cls.run).items()
+            for param, value in cls._default_arg_values().items()
             if param not in {"key", "path"}
         }
 
     @classmethod
     def _get_default_key(cls) -> str:
-        vals = ReflectionTools.default_arg_values(cls.run)
+        vals = cls._default_arg_values()
         try:
             return vals["key"]
         except KeyError:
             logger.error(f"key not in {vals.keys()} for {cls.__name__}")
             raise
 
+    @classmethod
+    @cache
+    def _default_arg_values(cls) -> Mapping[str, Any]:
+        # inspecting the signature is slow, and run never changes for a class
+        return ReflectionTools.default_arg_values(cls.run)
+
 
 __all__ = ["Entry"]
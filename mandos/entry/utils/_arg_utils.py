@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import operator
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 from typing import (
     AbstractSet,
     Any,
@@ -11,29 +14,41 @@ from typing import (
     Mapping,
     Optional,
     Sequence,
-    Set,
     Tuple,
     TypeVar,
     Union,
 )
 
 import decorateme
+import regex
 from pocketutils.core.exceptions import PathExistsError, XTypeError, XValueError
 from pocketutils.misc.typer_utils import Arg, Opt
 from pocketutils.tools.filesys_tools import FilesysTools
 from pocketutils.tools.path_tools import PathTools
-from regex import regex
 from typeddfs.df_errors import FilenameSuffixError
 
 from mandos.model.apis.chembl_support.chembl_targets import TargetType
 from mandos.model.settings import SETTINGS
 from mandos.model.taxonomy import KnownTaxa, Taxonomy
 from mandos.model.taxonomy_caches import LazyTaxonomy, TaxonomyFactories
-from mandos.model.utils.globals import Globals
 from mandos.model.utils.setup import logger
 
 T = TypeVar("T", covariant=True)
 _dir_name_pattern = regex.compile(r"([^*]*)(?:\*(\..+))?", flags=regex.V1)
+_std_taxa: Mapping[str, Sequence[int]] = MappingProxyType(
+    dict(
+        vertebrata=(KnownTaxa.vertebrata,),
+        vertebrate=(KnownTaxa.vertebrata,),
+        vertebrates=(KnownTaxa.vertebrata,),
+        cellular=(KnownTaxa.cellular,),
+        cell=(KnownTaxa.cellular,),
+        cells=(KnownTaxa.cellular,),
+        viral=(KnownTaxa.viral,),
+        virus=(KnownTaxa.viral,),
+        viruses=(KnownTaxa.viral,),
+        all=(KnownTaxa.cellular, KnownTaxa.viral),
+    )
+)
 
 
 @dataclass(frozen=True, repr=True, order=True)
@@ -45,7 +60,7 @@ class ParsedTaxa:
 
     @classmethod
     def empty(cls) -> ParsedTaxa:
-        return ParsedTaxa("", [], [], [])
+        return ParsedTaxa("", (), (), ())
 
 
 @decorateme.auto_utils()
@@ -69,17 +84,11 @@ class ArgUtils:
         attr: Union[None, str, Callable[[Any], Any]] = None,
         sep: str = ", ",
     ) -> str:
-        x = []
-        for v in lst:
-            if attr is None and hasattr(v, "name"):
-                x += [v.name]
-            elif attr is None:
-                x += [str(v)]
-            elif isinstance(attr, str):
-                x += [str(getattr(v, attr))]
-            else:
-                x += [str(attr(v))]
-        return sep.join(x)
+        if attr is None:
+            return sep.join(v.name if hasattr(v, "name") else str(v) for v in lst)
+        if isinstance(attr, str):
+            attr = operator.attrgetter(attr)
+        return sep.join(str(attr(v)) for v in lst)
 
     @classmethod
     def get_taxonomy(
@@ -100,6 +109,7 @@ class ArgUtils:
         )
 
     @classmethod
+    @lru_cache(maxsize=128)
     def parse_taxa(
         cls,
         taxa: Optional[str],
@@ -110,63 +120,65 @@ class ArgUtils:
             return ParsedTaxa.empty()
         ancestors = f"{KnownTaxa.cellular},{KnownTaxa.viral}"
         if ":" in taxa:
-            ancestors = taxa.split(":", 1)[1]
-            taxa = taxa.split(":", 1)[0]
-        taxa_objs = [t.strip() for t in taxa.split(",") if len(t.strip()) > 0]
-        allow = [t.strip().lstrip("+") for t in taxa_objs if not t.startswith("-")]
-        forbid = [t.strip().lstrip("-") for t in taxa_objs if t.startswith("-")]
-        ancestors = [t.strip() for t in ancestors.split(",")]
+            taxa, ancestors = taxa.split(":", 1)
+        allow, forbid = [], []
+        for t in cls._split_taxa(taxa):
+            if t.startswith("-"):
+                forbid.extend(cls._parse_taxa_token(t.lstrip("-"), id_only=False))
+            else:
+                allow.extend(cls._parse_taxa_token(t.lstrip("+"), id_only=False))
         if not allow_forbid and len(forbid) > 0:
             raise XValueError(f"Cannot use '-' in {taxa}")
         return ParsedTaxa(
             source=taxa,
-            allow=[ArgUtils.parse_taxon(t, id_only=False) for t in allow],
-            forbid=[ArgUtils.parse_taxon(t, id_only=False) for t in forbid],
-            ancestors=[ArgUtils.parse_taxon(t, id_only=True) for t in ancestors],
+            allow=tuple(allow),
+            forbid=tuple(forbid),
+            ancestors=cls.parse_taxa_ids(ancestors),
         )
 
     @classmethod
+    @lru_cache(maxsize=128)
     def parse_taxa_ids(cls, taxa: str) -> Sequence[int]:
         """
         Does not allow negatives.
         """
         if taxa is None or taxa == "":
-            return []
-        taxa = [t.strip() for t in taxa.split(",") if len(t.strip()) > 0]
-        return [ArgUtils.parse_taxon(t, id_only=True) for t in taxa]
+            return ()
+        return tuple(
+            x for t in cls._split_taxa(taxa) for x in cls._parse_taxa_token(t, id_only=True)
+        )
+
+    @classmethod
+    def _split_taxa(cls, taxa: str) -> Sequence[str]:
+        tokens = (t.strip() for t in taxa.split(","))
+        return [t for t in tokens if len(t) > 0]
+
+    @classmethod
+    def _parse_taxa_token(cls, taxon: str, *, id_only: bool) -> Sequence[Union[int, str]]:
+        # an alias like "all" can stand for more than one taxon
+        if taxon in _std_taxa:
+            return _std_taxa[taxon]
+        return (cls.parse_taxon(taxon, id_only=id_only),)
 
     @classmethod
     def parse_taxon(cls, taxon: Union[int, str], *, id_only: bool = False) -> Union[int, str]:
-        std = cls._get_std_taxon(taxon)
-        if isinstance(taxon, str) and taxon in std:
-            return std
-        if isinstance(taxon, str) and not id_only:
+        if isinstance(taxon, int):
             return taxon
-        elif isinstance(taxon, str) and taxon.isdigit():
+        std = _std_taxa.get(taxon)
+        if std is not None and len(std) == 1:
+            return std[0]
+        elif std is not None:
+            raise XValueError(f"Taxon alias {taxon} refers to {len(std)} taxa")
+        if taxon.isdigit():
             return int(taxon)
         if id_only:
             raise XTypeError(f"Taxon {taxon} must be an ID")
-        raise XTypeError(f"Taxon {taxon} must be an ID or name")
-
-    @classmethod
-    def _get_std_taxon(cls, taxa: str) -> str:
-        x = dict(
-            vertebrata=KnownTaxa.vertebrata,
-            vertebrate=KnownTaxa.vertebrata,
-            vertebrates=KnownTaxa.vertebrata,
-            cellular=KnownTaxa.cellular,
-            cell=KnownTaxa.cellular,
-            cells=KnownTaxa.cellular,
-            viral=KnownTaxa.viral,
-            virus=KnownTaxa.viral,
-            viruses=KnownTaxa.viral,
-            all=f"{Globals.cellular_taxon},{Globals.viral_taxon}",
-        ).get(taxa)
-        return taxa if x is None else str(x)
+        return taxon
 
     @staticmethod
-    def get_target_types(st: str) -> Set[str]:
-        return {s.name for s in TargetType.resolve(st)}
+    @lru_cache(maxsize=128)
+    def get_target_types(st: str) -> AbstractSet[str]:
+        return frozenset(s.name for s in TargetType.resolve(st))
 
 
 @decorateme.auto_utils()
@@ -181,17 +193,17 @@ class EntryUtils:
         suffixes: Union[None, AbstractSet[str], Callable[[Union[Path, str]], Any]] = None,
         quiet: bool = False,
     ) -> Path:
+        to_str = None if to is None else str(to)
         if to is None:
             path = Path(default)
-        elif str(to).startswith("."):
-            path = Path(default).with_suffix(str(to))
-        elif str(to).startswith("*."):
-            path = Path(default).with_suffix(str(to)[1:])
-        elif to.is_dir() or to.suffix == "":
+        elif to_str.startswith("."):
+            path = Path(default).with_suffix(to_str)
+        elif to_str.startswith("*."):
+            path = Path(default).with_suffix(to_str[1:])
+        elif to.suffix == "" or to.is_dir():  # check the suffix first to avoid a stat
             path = to / default
         else:
             path = Path(to)
-        path = Path(path)
         if os.name == "nt" and SETTINGS.sanitize_paths:
             new_path = Path(*PathTools.sanitize_nodes(path.parts, is_file=True))
             if new_path.resolve() != path.resolve():
@@ -237,10 +249,10 @@ class EntryUtils:
         if info.exists and not info.is_dir:
             raise PathExistsError(f"Path {out_dir} already exists but and is not a directory")
         cls._check_suffix(suffix, suffixes)
-        if info.exists:
-            n_files = len(list(out_dir.iterdir()))
-            if n_files > 0 and not quiet:
-                logger.debug(f"Directory {out_dir} is non-emtpy")
+        if info.exists and not quiet:
+            with os.scandir(out_dir) as entries:
+                if next(entries, None) is not None:
+                    logger.debug(f"Directory {out_dir} is non-empty")
         logger.debug(f"Output dir is {out_dir} (suffix: {suffix})")
         return out_dir, suffix
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Sequence, Set
+from typing import Mapping, Sequence, Set
 
 from pocketutils.core.dot_dict import NestedDotDict
 
@@ -29,12 +29,26 @@ class AtcSearch(ChemblSearch[AtcHit]):
         compound = ChemblUtils(self.api).compound_dot_dict_to_obj(ch)
         hits = []
         if "atc_classifications" in ch:
-            for atc in ch["atc_classifications"]:
-                hits.extend(self.process(lookup, compound, atc))
+            atcs = ch["atc_classifications"]
+            atc_to_dots = self._get_atcs(atcs)
+            for atc in atcs:
+                hits.extend(self.process(lookup, compound, atc_to_dots[atc]))
         return hits
 
-    def process(self, lookup: str, compound: ChemblCompound, atc: str) -> Sequence[AtcHit]:
-        dots = NestedDotDict(self.api.atc_class.get(atc))
+    def _get_atcs(self, atcs: Sequence[str]) -> Mapping[str, NestedDotDict]:
+        if len(atcs) == 0:
+            return {}  # most compounds have no ATC codes; don't send a request for them
+        # fetch all of the compound's codes in one request rather than one request per code
+        query = self.api.atc_class.filter(level5__in=list(atcs))
+        found = {dots["level5"]: dots for dots in query}
+        for atc in atcs:
+            if atc not in found:
+                found[atc] = NestedDotDict(self.api.atc_class.get(atc))
+        return found
+
+    def process(
+        self, lookup: str, compound: ChemblCompound, dots: NestedDotDict
+    ) -> Sequence[AtcHit]:
         found = []
         for level in sorted(self.levels):
             found.append(self._code(lookup, compound, dots, level))
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from pocketutils.core.dot_dict import NestedDotDict
 from typeddfs.matrix_dfs import MatrixDf
@@ -14,6 +15,12 @@ class TestIoDefns:
         long = df.to_long_form("phi", "phi")
         assert len(long) == 9
 
+    def test_from_ndarray(self):
+        data = np.array([[1, 0.5], [0.5, 1]])
+        df = SimilarityDfShortForm.from_ndarray(data, ["AAA", "BBB"])
+        assert df.rows == df.cols == ["AAA", "BBB"]
+        assert df.at["AAA", "BBB"] == 0.5
+
 
 if __name__ == "__main__":
     pytest.main()
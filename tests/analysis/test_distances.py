@@ -0,0 +1,124 @@
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pytest
+
+from mandos.analysis import distances
+from mandos.analysis.distances import JPrimeMatrixCalculator
+from mandos.model.hits import AbstractHit
+
+
+@dataclass(frozen=True, order=True, repr=True)
+class _SimpleHit(AbstractHit):
+    """"""
+
+
+def _hit(inchikey: str, obj: Optional[str], weight: float, source: str = "src") -> _SimpleHit:
+    return _SimpleHit(
+        record_id=None,
+        origin_inchikey=inchikey,
+        matched_inchikey=inchikey,
+        compound_id=inchikey,
+        compound_name=inchikey,
+        predicate="pred",
+        object_id=obj,
+        object_name=obj,
+        weight=weight,
+        search_key="key",
+        search_class="search",
+        data_source=source,
+        run_date=datetime.now(),
+        cache_date=None,
+    )
+
+
+def _j(hits1, hits2) -> float:
+    pairs = {(h.predicate, h.object_name) for h in hits1 + hits2}
+    values = []
+    for pred, obj in pairs:
+        ca = sum(h.weight for h in hits1 if (h.predicate, h.object_name) == (pred, obj))
+        cb = sum(h.weight for h in hits2 if (h.predicate, h.object_name) == (pred, obj))
+        la, lb = math.log10(1 + ca), math.log10(1 + cb)
+        values.append(math.sqrt(la * lb) / (la + lb - math.sqrt(la * lb)))
+    return sum(values) / len(values)
+
+
+class TestDistances:
+    @pytest.mark.parametrize("jit", [True, False])
+    def test_j_prime(self, jit: bool, monkeypatch):
+        if not jit:
+            monkeypatch.setattr(distances, "_j_matrix_kernel", None)
+        hits = [
+            _hit("AAA", "x", 1),
+            _hit("AAA", "y", 2),
+            _hit("AAA", "y", 1),
+            _hit("BBB", "y", 4),
+            _hit("BBB", "z", 1),
+            _hit("BBB", "z", 1, source="other"),
+            _hit("CCC", "z", 3, source="other"),
+            _hit("DDD", "x", 5, source="third"),
+        ]
+        calc = JPrimeMatrixCalculator(min_compounds=0, min_nonzero=0, min_hits=0)
+        df = calc.calc_one("key", hits)
+        assert df.rows == df.cols == ["AAA", "BBB", "CCC", "DDD"]
+        assert np.isnan(df.values[np.triu_indices(4, k=1)]).all()
+        assert np.allclose(np.diag(df.values), 1)
+        ab = _j(hits[0:3], hits[3:5])
+        assert df.at["BBB", "AAA"] == pytest.approx(ab)
+        # only the source that BBB and CCC share counts
+        assert df.at["CCC", "BBB"] == pytest.approx(_j(hits[5:6], hits[6:7]))
+        assert np.isnan(df.at["CCC", "AAA"])
+        assert np.isnan(df.at["DDD", "AAA"])
+
+    @pytest.mark.parametrize("jit", [True, False])
+    def test_one_compound(self, jit: bool, monkeypatch):
+        if not jit:
+            monkeypatch.setattr(distances, "_j_matrix_kernel", None)
+        hits = [_hit("AAA", "x", 1), _hit("AAA", "y", 2, source="other")]
+        calc = JPrimeMatrixCalculator(min_compounds=0, min_nonzero=0, min_hits=0)
+        df = calc.calc_one("key", hits)
+        assert df.rows == df.cols == ["AAA"]
+        assert df.at["AAA", "AAA"] == 1
+
+    def test_missing_object(self):
+        hits = [
+            _hit("AAA", None, 1),
+            _hit("AAA", "x", 2),
+            _hit("BBB", None, 3),
+            _hit("BBB", "y", 1),
+        ]
+        calc = JPrimeMatrixCalculator(min_compounds=0, min_nonzero=0, min_hits=0)
+        df = calc.calc_one("key", hits)
+        assert df.at["BBB", "AAA"] == pytest.approx(_j(hits[0:2], hits[2:4]))
+
+    def test_n_real(self):
+        hits = [
+            _hit("AAA", "x", 1),
+            _hit("BBB", "x", 2),
+            _hit("BBB", "y", 1),
+            _hit("CCC", "x", 1),
+            _hit("DDD", "z", 1),
+        ]
+        calc = JPrimeMatrixCalculator(min_compounds=0, min_nonzero=0, min_hits=0)
+        df = calc._calc_partial("key", hits)
+        # AAA-BBB and BBB-CCC are strictly between 0 and 1; AAA-CCC is 1; DDD shares nothing
+        assert df.attrs["n_real"] == 2
+        assert len(df[df["value"].notna()]) == 4 * 5 // 2
+
+    @pytest.mark.skipif(distances.njit is None, reason="numba is not installed")
+    def test_kernel_matches_numpy(self):
+        rand = np.random.RandomState(0)
+        weights = rand.choice([0, 0, 0, 1, 2, 5], size=(40, 25)).astype(np.float64)
+        weights[3] = 0
+        ell = np.log10(1 + weights)
+        calc = JPrimeMatrixCalculator(min_compounds=0, min_nonzero=0, min_hits=0)
+        expected = calc._j_source_numpy(ell, ell.any(axis=1))
+        expected[3], expected[:, 3] = np.nan, np.nan
+        np.testing.assert_allclose(calc._j_source(ell), expected)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,42 @@
+import pytest
+from pocketutils.core.exceptions import XTypeError, XValueError
+
+from mandos.entry.utils._arg_utils import ArgUtils
+from mandos.model.taxonomy import KnownTaxa
+
+
+class TestArgUtils:
+    def test_parse_taxon_alias(self):
+        assert ArgUtils.parse_taxon("vertebrates") == KnownTaxa.vertebrata
+        assert ArgUtils.parse_taxon("viral", id_only=True) == KnownTaxa.viral
+        assert ArgUtils.parse_taxon("9606") == 9606
+        assert ArgUtils.parse_taxon("mammalia") == "mammalia"
+        with pytest.raises(XValueError):
+            ArgUtils.parse_taxon("all")
+
+    def test_parse_taxa_alias(self):
+        parsed = ArgUtils.parse_taxa("all,-viruses:cells")
+        assert parsed.allow == (KnownTaxa.cellular, KnownTaxa.viral)
+        assert parsed.forbid == (KnownTaxa.viral,)
+        assert parsed.ancestors == (KnownTaxa.cellular,)
+        assert ArgUtils.parse_taxa_ids("all") == (KnownTaxa.cellular, KnownTaxa.viral)
+
+    def test_parse_taxa(self):
+        parsed = ArgUtils.parse_taxa("a,-b:1,2,")
+        assert parsed.source == "a,-b"
+        assert parsed.allow == ("a",)
+        assert parsed.forbid == ("b",)
+        assert parsed.ancestors == (1, 2)
+        assert ArgUtils.parse_taxa("") == ArgUtils.parse_taxa(None)
+        with pytest.raises(XValueError):
+            ArgUtils.parse_taxa("a,-b", allow_forbid=False)
+
+    def test_parse_taxa_ids(self):
+        assert ArgUtils.parse_taxa_ids("") == ()
+        assert ArgUtils.parse_taxa_ids(" 1, ,2,") == (1, 2)
+        with pytest.raises(XTypeError):
+            ArgUtils.parse_taxa_ids("a")
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,60 @@
+import pytest
+
+from mandos.model.apis.chembl_api import ChemblApi, ChemblEntrypoint
+from mandos.search.chembl.atc_search import AtcSearch
+
+
+class TestAtcsMocked:
+    def test_find(self):
+        alprazolam = dict(
+            molecule_chembl_id="CHEMBL661",
+            pref_name="ALPRAZOLAM",
+            structure_type="MOL",
+            molecule_hierarchy=dict(parent_chembl_id="CHEMBL661"),
+            molecule_structures=dict(standard_inchi="InChI=1S/", standard_inchi_key="VREFGVBL"),
+            atc_classifications=["N05BA12", "X99XX99"],
+        )
+        n05ba12 = dict(level5="N05BA12", level1="N", level1_description="NERVOUS SYSTEM")
+        x99xx99 = dict(level5="X99XX99", level1="X", level1_description="OTHER")
+        filters = []
+
+        def filter_atcs(kwargs):
+            filters.append(kwargs)
+            return [n05ba12]  # the query doesn't return X99XX99
+
+        api = ChemblApi.mock(
+            {
+                "molecule": ChemblEntrypoint.mock({"VREFGVBL": alprazolam}),
+                "atc_class": ChemblEntrypoint.mock({"X99XX99": x99xx99}, filter_atcs),
+            }
+        )
+        search = AtcSearch("atc", {1}, api)
+        hits = search.find("VREFGVBL")
+        assert filters == [dict(level5__in=["N05BA12", "X99XX99"])]
+        assert [h.object_id for h in hits] == ["N", "X"]
+        assert [h.object_name for h in hits] == ["NERVOUS SYSTEM", "OTHER"]
+
+    def test_find_no_atcs(self):
+        compound = dict(
+            molecule_chembl_id="CHEMBL1",
+            pref_name="NOTHING",
+            structure_type="MOL",
+            molecule_hierarchy=dict(parent_chembl_id="CHEMBL1"),
+            molecule_structures=dict(standard_inchi="InChI=1S/", standard_inchi_key="AAAA"),
+            atc_classifications=[],
+        )
+
+        def filter_atcs(kwargs):
+            raise AssertionError(f"Queried ATC codes with {kwargs}")
+
+        api = ChemblApi.mock(
+            {
+                "molecule": ChemblEntrypoint.mock({"AAAA": compound}),
+                "atc_class": ChemblEntrypoint.mock({}, filter_atcs),
+            }
+        )
+        assert AtcSearch("atc", {1}, api).find("AAAA") == []
+
+
+if __name__ == "__main__":
+    pytest.main()